@@ -3,13 +3,18 @@ import streamlit as st
 import pandas as pd
 from datetime import datetime, timedelta
 from utils import (
-    fetch_newsapi_articles,
-    fetch_google_news_rss,
+    fetch_newsapi_articles_async,
+    fetch_google_news_rss_cached,
     dedupe_articles,
     detect_mutual_fund_mentions,
+    mf_lower_pairs,
+    clear_news_cache,
     normalize_article,
 )
+import asyncio
+import io
 import os
+import re
 
 st.set_page_config(page_title="F&O News & Mutual Fund Source Tracker", layout="wide")
 
@@ -34,13 +39,17 @@ default_query = {
 query = st.sidebar.text_input("Search query (Google News / NewsAPI)", value=default_query, help="Keywords used to query news. Tweak as needed.")
 from_days = st.sidebar.number_input("Lookback (days)", min_value=1, max_value=30, value=7, step=1)
 limit = st.sidebar.number_input("Max articles to fetch (per source)", min_value=10, max_value=500, value=150, step=10)
+full_scrape = st.sidebar.checkbox("Fetch full article text", value=False, help="Scrape Google News article pages whose RSS summary is short. Slower.")
 
 st.sidebar.markdown("### NewsAPI (optional)")
 newsapi_key = st.sidebar.text_input("NewsAPI.org API key", value=os.getenv("NEWSAPI_KEY", ""), help="If you provide this, NewsAPI will be used (faster, richer). Get a key at https://newsapi.org")
 
 st.sidebar.markdown("### Mutual Fund firms to detect")
 mf_list_input = st.sidebar.text_area("Comma-separated list", value="SBI Mutual Fund,HDFC AMC,ICICI Prudential Mutual Fund,Axis Mutual Fund,Nippon India Mutual Fund,UTI Mutual Fund,Aditya Birla Sun Life Mutual Fund", height=120)
-mf_list = [m.strip() for m in mf_list_input.split(",") if m.strip()]
+mf_list = tuple(m.strip() for m in mf_list_input.split(",") if m.strip())
+
+if st.sidebar.button("Clear cached results", help="Cached fetches are reused for 15 minutes, also across app restarts."):
+    clear_news_cache()
 
 if st.sidebar.button("Fetch latest F&O news now"):
     st.session_state.fetch = True
@@ -51,74 +60,96 @@ if "fetch" not in st.session_state:
 # Manual trigger
 if st.session_state.fetch:
     with st.spinner("Fetching articles..."):
-        from_date = (datetime.utcnow() - timedelta(days=int(from_days))).isoformat()
+        # truncated to the hour so repeat fetches share a cache key
+        from_date = (datetime.utcnow() - timedelta(days=int(from_days))).replace(minute=0, second=0, microsecond=0).isoformat()
         all_articles = []
 
-        # 1) NewsAPI (if key provided)
-        if newsapi_key:
-            try:
-                n_articles = fetch_newsapi_articles(query=query, from_iso=from_date, api_key=newsapi_key, page_size=min(limit,100))
-                for a in n_articles:
-                    a_norm = normalize_article(a, source="NewsAPI")
-                    a_norm["source_detected_mf"] = detect_mutual_fund_mentions(a_norm, mf_list)
-                    all_articles.append(a_norm)
-                st.success(f"Fetched {len(n_articles)} articles from NewsAPI.")
-            except Exception as e:
-                st.error(f"NewsAPI error: {e}")
+        mf_pairs = mf_lower_pairs(mf_list)
+
+        def _with_mf(a_norm):
+            # _search_text is only needed for detection; keep it out of the DataFrame
+            text = a_norm.pop("_search_text")
+            a_norm["source_detected_mf"] = detect_mutual_fund_mentions(a_norm["id"], text, mf_pairs)
+            return a_norm
+
+        # NewsAPI (if key provided) and Google News RSS are fetched concurrently
+        async def _fetch_all():
+            newsapi_task = (
+                fetch_newsapi_articles_async(query=query, from_iso=from_date, api_key=newsapi_key, page_size=min(limit,100))
+                if newsapi_key else asyncio.sleep(0, result=None)
+            )
+            # cached sync wrapper runs its own event loop in a worker thread
+            rss_task = asyncio.to_thread(fetch_google_news_rss_cached, query, limit, full_scrape)
+            return await asyncio.gather(newsapi_task, rss_task, return_exceptions=True)
+
+        n_articles, g_articles = asyncio.run(_fetch_all())
+
+        # 1) NewsAPI
+        if isinstance(n_articles, Exception):
+            st.error(f"NewsAPI error: {n_articles}")
+        elif n_articles is not None:
+            for a in n_articles:
+                all_articles.append(_with_mf(normalize_article(a, source="NewsAPI")))
+            st.success(f"Fetched {len(n_articles)} articles from NewsAPI.")
 
         # 2) Google News RSS
-        try:
-            g_articles = fetch_google_news_rss(query=query, limit=limit)
+        if isinstance(g_articles, Exception):
+            st.error(f"Google News RSS error: {g_articles}")
+        else:
             for a in g_articles:
-                a_norm = normalize_article(a, source="GoogleNewsRSS")
-                a_norm["source_detected_mf"] = detect_mutual_fund_mentions(a_norm, mf_list)
-                all_articles.append(a_norm)
+                all_articles.append(_with_mf(normalize_article(a, source="GoogleNewsRSS")))
             st.success(f"Fetched {len(g_articles)} items from Google News RSS.")
-        except Exception as e:
-            st.error(f"Google News RSS error: {e}")
 
         # dedupe + sort
-        combined = dedupe_articles(all_articles)
-        df = pd.DataFrame(combined)
+        df = dedupe_articles(all_articles)
         if df.empty:
             st.warning("No articles found for that query/time window.")
         else:
-            df["published"] = pd.to_datetime(df["published"], errors="coerce")
             df = df.sort_values("published", ascending=False)
             st.session_state.df = df
+            # long-format (id, firm) lookup so MF filters are a vectorized isin
+            st.session_state.mf_long = df.explode("source_detected_mf").dropna(subset=["source_detected_mf"])[["id", "source_detected_mf"]]
+            # MF filter options only change when results do, so build them here once
+            st.session_state.mf_options = ["(any)"] + sorted(st.session_state.mf_long["source_detected_mf"].unique())
             st.success(f"Aggregated {len(df)} unique articles.")
 
 # Display results if present
 if "df" in st.session_state and not st.session_state.df.empty:
-    df = st.session_state.df.copy()
+    # read-only below, so no copy needed
+    df = st.session_state.df
 
     # Filters
     st.subheader("Results")
-    cols = st.columns([3, 1, 1, 2, 1])
+    cols = st.columns([3, 1, 1, 2])
     with cols[0]:
         txt_filter = st.text_input("Filter by keyword (title/description/content)", value="")
     with cols[1]:
-        mf_filter = st.selectbox("Filter by detected MF firm", options=["(any)"] + sorted(list({mf for mfs in df["source_detected_mf"].tolist() for mf in mfs if mfs})))
+        mf_filter = st.selectbox("Filter by detected MF firm", options=st.session_state.mf_options)
     with cols[2]:
         show_only_with_mf = st.checkbox("Show only items mentioning mutual fund firm", value=False)
     with cols[3]:
         max_rows = st.number_input("Show rows", value=50, min_value=5, max_value=1000, step=5)
-    with cols[4]:
-        download_btn = st.button("Download CSV")
 
-    filtered = df
+    # compose all filters into one mask and slice once
+    mask = pd.Series(True, index=df.index)
     if txt_filter:
-        mask = filtered[["title", "description", "content"]].fillna("").apply(lambda col: col.str.contains(txt_filter, case=False, na=False))
-        keep = mask.any(axis=1)
-        filtered = filtered[keep]
+        pat = re.compile(re.escape(txt_filter), re.IGNORECASE)
+        mask &= (
+            df["title"].fillna("").str.contains(pat)
+            | df["description"].fillna("").str.contains(pat)
+            | df["content"].fillna("").str.contains(pat)
+        )
+    mf_long = st.session_state.mf_long
     if mf_filter and mf_filter != "(any)":
-        filtered = filtered[filtered["source_detected_mf"].apply(lambda arr: mf_filter in arr)]
+        mask &= df["id"].isin(mf_long.loc[mf_long["source_detected_mf"] == mf_filter, "id"])
     if show_only_with_mf:
-        filtered = filtered[filtered["source_detected_mf"].apply(lambda arr: len(arr) > 0)]
+        mask &= df["id"].isin(mf_long["id"])
+    filtered = df[mask]
 
     st.write(f"Showing {len(filtered)} articles (of {len(df)} total).")
     display_cols = ["published", "title", "source", "source_url", "source_detected_mf", "summary"]
     display_df = filtered[display_cols].head(int(max_rows)).copy()
+    display_df["published"] = display_df["published"].dt.strftime("%Y-%m-%d %H:%M")
     display_df = display_df.rename(columns={
         "published": "Published",
         "title": "Title",
@@ -127,22 +158,29 @@ if "df" in st.session_state and not st.session_state.df.empty:
         "source_detected_mf": "Detected MF Firms (from text)",
         "summary": "Snippet"
     })
-    st.dataframe(display_df, use_container_width=True)
+    st.dataframe(display_df, use_container_width=True, key="res_tbl", on_select="rerun", selection_mode="single-row")
 
-    # Expand row view
+    # Selected row view
     st.markdown("### Article details")
-    for idx, row in filtered.head(int(max_rows)).iterrows():
-        with st.expander(f"{row['published'].strftime('%Y-%m-%d %H:%M') if row['published'] is not pd.NaT else 'Unknown'} — {row['title']}"):
-            st.write(f"**Source:** {row.get('source','')}")
-            st.write(f"**URL:** {row.get('source_url','')}")
-            st.write(f"**Detected MF firms:** {row.get('source_detected_mf', [])}")
-            st.write(row.get("content") or row.get("description") or "")
-            st.write("---")
-
-    # Download CSV
-    if download_btn:
-        csv = filtered.to_csv(index=False)
-        st.download_button("Download CSV", data=csv, file_name=f"fno_news_{datetime.utcnow().date()}.csv", mime="text/csv")
+    sel = st.session_state.res_tbl.selection.rows
+    # selection can point past the table after filters shrink it
+    if sel and sel[0] < len(display_df):
+        row = filtered.iloc[sel[0]]
+        st.markdown(f"**{row['published'].strftime('%Y-%m-%d %H:%M')} — {row['title']}**")
+        st.write(f"**Source:** {row.get('source','')}")
+        st.write(f"**URL:** {row.get('source_url','')}")
+        st.write(f"**Detected MF firms:** {row.get('source_detected_mf', [])}")
+        st.write(row.get("content") or row.get("description") or "")
+    else:
+        st.caption("Select a row in the table above to see the full article text.")
+
+    # Download CSV (generated only when the button is clicked)
+    def _make_csv(frame=filtered):
+        buf = io.BytesIO()
+        frame.to_csv(buf, index=False)
+        return buf.getvalue()
+
+    st.download_button("Download CSV", data=_make_csv, file_name=f"fno_news_{datetime.utcnow().date()}.csv", mime="text/csv")
 
 else:
     st.info("Click 'Fetch latest F&O news now' in the sidebar to collect articles.")
@@ -1,28 +1,68 @@
 # utils.py
 import requests
-import feedparser
-from bs4 import BeautifulSoup
+import pandas as pd
+import streamlit as st
+from bs4 import BeautifulSoup, SoupStrainer
+from lxml import etree
+import httpx
+import diskcache
+import asyncio
 import hashlib
-from datetime import datetime
+from collections import defaultdict
+from functools import lru_cache
+from urllib.parse import urlparse
 import re
 
-def fetch_newsapi_articles(query: str, from_iso: str, api_key: str, page_size: int = 100):
+try:
+    import ahocorasick
+except ImportError:  # optional; detect_mutual_fund_mentions falls back to substring scan
+    ahocorasick = None
+
+NEWSAPI_URL = "https://newsapi.org/v2/everything"
+
+# Keep-alive HTTP/2 client settings. Clients can't outlive an event loop, so
+# pooling lasts for one asyncio.run; each fetch reuses a single client throughout.
+_HTTP_HEADERS = {"User-Agent": "Mozilla/5.0", "Accept-Encoding": "gzip"}
+_HTTP_LIMITS = httpx.Limits(max_connections=20, max_keepalive_connections=20)
+
+# Fetch results persisted on disk so app restarts don't repeat identical requests
+news_cache = diskcache.Cache("./.news_cache")
+_NEWS_CACHE_TTL = 900  # seconds
+
+def _cached(key):
     """
-    Fetch articles using NewsAPI.org everything endpoint.
-    Returns list of dicts with keys: title, description, content, url, publishedAt, source.name
+    Single-lookup read (None on miss/expiry); a separate `in` check can race the TTL.
     """
-    url = "https://newsapi.org/v2/everything"
-    headers = {"Authorization": api_key}
-    params = {
+    return news_cache.get(key)
+
+def _cache_put(key, value):
+    news_cache.set(key, value, expire=_NEWS_CACHE_TTL)
+
+def clear_news_cache():
+    """
+    Drop all cached fetch results (disk and in-process).
+    """
+    news_cache.clear()
+    fetch_google_news_rss_cached.clear()
+
+def _async_client(**kwargs):
+    """
+    AsyncClient with the shared HTTP/2 settings; one per fetch run (asyncio.run call).
+    """
+    kwargs.setdefault("timeout", 20)
+    kwargs.setdefault("limits", _HTTP_LIMITS)
+    return httpx.AsyncClient(http2=True, headers=_HTTP_HEADERS, follow_redirects=True, **kwargs)
+
+def _newsapi_params(query: str, from_iso: str, page_size: int):
+    return {
         "q": query,
         "from": from_iso,
         "language": "en",
         "pageSize": page_size,
         "sortBy": "publishedAt",
     }
-    resp = requests.get(url, params=params, headers=headers, timeout=20)
-    resp.raise_for_status()
-    data = resp.json()
+
+def _newsapi_to_articles(data: dict):
     articles = []
     for a in data.get("articles", []):
         articles.append({
@@ -35,40 +75,165 @@ def fetch_newsapi_articles(query: str, from_iso: str, api_key: str, page_size: i
         })
     return articles
 
-def fetch_google_news_rss(query: str, limit: int = 100):
+def fetch_newsapi_articles(query: str, from_iso: str, api_key: str, page_size: int = 100):
+    """
+    Fetch articles using NewsAPI.org everything endpoint.
+    Returns list of dicts with keys: title, description, content, url, publishedAt, source.name
+    """
+    return asyncio.run(fetch_newsapi_articles_async(query, from_iso, api_key, page_size))
+
+async def fetch_newsapi_articles_async(query: str, from_iso: str, api_key: str, page_size: int = 100):
+    """
+    Async variant of fetch_newsapi_articles (same return shape).
+    """
+    key = ("newsapi", query, from_iso, page_size)
+    # diskcache is blocking SQLite I/O; keep it off the event loop
+    cached = await asyncio.to_thread(_cached, key)
+    if cached is not None:
+        return cached
+    headers = {"Authorization": api_key}
+    params = _newsapi_params(query, from_iso, page_size)
+    async with _async_client() as client:
+        resp = await client.get(NEWSAPI_URL, params=params, headers=headers)
+    resp.raise_for_status()
+    articles = _newsapi_to_articles(resp.json())
+    await asyncio.to_thread(_cache_put, key, articles)
+    return articles
+
+_P_ONLY = SoupStrainer("p")
+
+def _parse_paragraphs(html: str):
+    """
+    Return text of the first paragraphs of an HTML page ("" if none).
+    Only <p> elements are built, so the rest of the DOM is never materialized.
+    """
+    soup = BeautifulSoup(html, "lxml", parse_only=_P_ONLY)
+    # pick first paragraphs
+    paras = []
+    for p in soup:
+        paras.append(p.get_text())
+        if len(paras) >= 6:
+            break
+    return " ".join(paras)
+
+# Scrape concurrency caps: overall, and per host so one site isn't hammered.
+# Every Google News RSS link is on news.google.com (HTTP/2, one multiplexed
+# connection), so the per-host cap effectively bounds the whole scrape.
+_SCRAPE_CONCURRENCY = 20
+_SCRAPE_PER_HOST = 10
+_SCRAPE_TIMEOUT = 8
+_SCRAPE_LIMITS = httpx.Limits(max_connections=50, max_keepalive_connections=20)
+
+async def _fetch_one(client, link, global_sem, host_sems):
+    """
+    Fetch one article page and return its leading paragraph text.
+    """
+    host = urlparse(link or "").netloc
+    # host first: waiting on a busy host must not hold a global slot
+    async with host_sems[host], global_sem:
+        r = await client.get(link, timeout=_SCRAPE_TIMEOUT)
+    # parsing is CPU-bound; keep it off the event loop
+    return await asyncio.to_thread(_parse_paragraphs, r.text)
+
+async def _scrape_all(client, links):
+    """
+    Scrape all links concurrently over the caller's client, bounded globally and per host.
+    Failed fetches come back as exception objects in the result list.
+    """
+    # semaphores bind to the running loop, so they are created per call
+    global_sem = asyncio.Semaphore(_SCRAPE_CONCURRENCY)
+    host_sems = defaultdict(lambda: asyncio.Semaphore(_SCRAPE_PER_HOST))
+    return await asyncio.gather(*[_fetch_one(client, l, global_sem, host_sems) for l in links], return_exceptions=True)
+
+def fetch_google_news_rss(query: str, limit: int = 100, full_scrape: bool = False):
     """
     Use Google News RSS for a given query.
     Returns list of dicts with title, description, link, published.
+    With full_scrape, entries whose RSS summary is short get their page text scraped.
+    """
+    return asyncio.run(fetch_google_news_rss_async(query, limit, full_scrape))
+
+@st.cache_data(ttl=300, show_spinner=False)
+def fetch_google_news_rss_cached(query: str, limit: int = 100, full_scrape: bool = False):
+    """
+    fetch_google_news_rss cached for 5 minutes per (query, limit, full_scrape).
+    """
+    return fetch_google_news_rss(query, limit, full_scrape)
+
+_RSS_PARSER = etree.XMLParser(resolve_entities=False, no_network=True)
+
+def _strip_markup(html: str):
+    """
+    Visible text of an HTML fragment, whitespace collapsed (Google News descriptions are <a>/<font> markup).
+    """
+    if not html:
+        return ""
+    return " ".join(BeautifulSoup(html, "lxml").get_text(" ").split())
+
+def _parse_rss_items(body: bytes, limit: int):
+    """
+    Parse Google News RSS (channel/item/{title,link,pubDate,description,source}) into entry dicts.
+    """
+    root = etree.fromstring(body, parser=_RSS_PARSER)
+    entries = []
+    for it in root.findall(".//item")[:limit]:
+        src = it.find("{*}source")
+        entries.append({
+            "title": it.findtext("title"),
+            "link": it.findtext("link"),
+            "published": it.findtext("pubDate"),
+            "summary": _strip_markup(it.findtext("description", default="")),
+            "source": src.text if src is not None else None,
+        })
+    return entries
+
+async def _rss_body(client, url: str):
+    r = await client.get(url)
+    r.raise_for_status()
+    return r.content
+
+async def fetch_google_news_rss_async(query: str, limit: int = 100, full_scrape: bool = False):
     """
+    Async variant of fetch_google_news_rss (same return shape).
+    """
+    key = ("rss", query, limit, full_scrape)
+    # diskcache is blocking SQLite I/O; keep it off the event loop
+    cached = await asyncio.to_thread(_cached, key)
+    if cached is not None:
+        return cached
     # Construct Google News RSS query
     # NOTE: Google News RSS uses the 'q' parameter; encode query
     q = requests.utils.requote_uri(query)
     rss_url = f"https://news.google.com/rss/search?q={q}&hl=en-US&gl=US&ceid=US:en"
-    feed = feedparser.parse(rss_url)
+    # one client for the feed and the scrape: both hit news.google.com, so the
+    # scrape reuses the feed's HTTP/2 connection instead of a new handshake
+    async with _async_client(limits=_SCRAPE_LIMITS) as client:
+        body = await _rss_body(client, rss_url)
+        entries = _parse_rss_items(body, limit)
+        # try to get full article text via link scraping (light), all links at once;
+        # only when asked to and the RSS summary is too short to be useful
+        pages = [None] * len(entries)
+        if full_scrape:
+            idx = [i for i, e in enumerate(entries) if len(e.get("summary", "")) < 200]
+            scraped = await _scrape_all(client, [entries[i].get("link") for i in idx])
+            for i, page_text in zip(idx, scraped):
+                pages[i] = page_text
     articles = []
-    for entry in feed.entries[:limit]:
-        # try to get full article text via link scraping (light)
+    for entry, page_text in zip(entries, pages):
         content = entry.get("summary", "")
         link = entry.get("link")
         published = entry.get("published")
-        # attempt to get fuller text (lightweight)
-        try:
-            page = requests.get(link, timeout=8, headers={"User-Agent": "Mozilla/5.0"})
-            soup = BeautifulSoup(page.text, "html.parser")
-            # pick first paragraphs
-            ps = soup.find_all("p")
-            if ps:
-                content = " ".join([p.get_text() for p in ps[:6]])
-        except Exception:
-            pass
+        if page_text and not isinstance(page_text, Exception):
+            content = page_text
         articles.append({
             "title": entry.get("title"),
             "description": entry.get("summary"),
             "content": content,
             "url": link,
             "published": published,
-            "source": entry.get("source", {}).get("title") if entry.get("source") else None,
+            "source": entry["source"],
         })
+    await asyncio.to_thread(_cache_put, key, articles)
     return articles
 
 def normalize_article(a: dict, source: str = None):
@@ -80,43 +245,62 @@ def normalize_article(a: dict, source: str = None):
     out["description"] = a.get("description") or ""
     out["content"] = a.get("content") or a.get("snippet") or out["description"]
     out["source_url"] = a.get("url") or a.get("link") or ""
-    out["published"] = a.get("published") or a.get("publishedAt") or datetime.utcnow().isoformat()
+    # raw string; parsed for the whole batch in dedupe_articles
+    out["published"] = a.get("published") or a.get("publishedAt")
     out["source"] = a.get("source") or source or ""
     out["summary"] = (out["description"][:300] + "...") if out["description"] else (out["content"][:300] + "...")
+    # lowercased once here so MF detection doesn't re-join/re-lower per call
+    out["_search_text"] = (out["title"] + " " + out["description"] + " " + out["content"]).lower()
     # id for dedupe
     key = (out["title"] or "") + (out["source_url"] or "")
-    out["id"] = hashlib.sha256(key.encode("utf-8")).hexdigest()
+    out["id"] = hashlib.blake2b(key.encode("utf-8"), digest_size=16).hexdigest()
     return out
 
 def dedupe_articles(articles):
     """
-    Remove duplicate articles by id (title+url hash), keep latest published.
-    """
-    seen = {}
-    for a in articles:
-        norm = normalize_article(a, source=a.get("source"))
-        key = norm["id"]
-        existing = seen.get(key)
-        if not existing:
-            seen[key] = norm
-        else:
-            # prefer one with longer content / later date
-            existing_content_len = len(existing.get("content","") or "")
-            new_content_len = len(norm.get("content","") or "")
-            if new_content_len > existing_content_len:
-                seen[key] = norm
-    return list(seen.values())
-
-def detect_mutual_fund_mentions(article: dict, mf_list):
-    """
-    Return list of mutual fund firm names found in title/description/content.
+    Remove duplicate articles by id (title+url hash), keep the one with longest content.
+    Expects articles already passed through normalize_article; returns a DataFrame
+    with "published" parsed to UTC timestamps (unparseable -> now).
+    """
+    if not articles:
+        return pd.DataFrame()
+    df = pd.DataFrame(articles)
+    # one vectorized parse over mixed RSS (RFC 822) / NewsAPI (ISO 8601) strings
+    df["published"] = pd.to_datetime(df["published"], utc=True, errors="coerce", format="mixed").fillna(pd.Timestamp.now(tz="UTC"))
+    df["_clen"] = df["content"].fillna("").str.len()
+    # stable sort so ties keep the first-seen article
+    df = df.sort_values("_clen", ascending=False, kind="stable").drop_duplicates(subset="id", keep="first")
+    return df.drop(columns="_clen")
+
+def mf_lower_pairs(mf_list):
+    """
+    Precompute (lowercased, original) firm name pairs once per batch.
+    """
+    return tuple((mf.lower(), mf) for mf in mf_list)
+
+@lru_cache(maxsize=16)
+def _mf_automaton(mf_pairs: tuple):
+    """
+    Build (once per MF list) an Aho-Corasick automaton over lowercased firm names.
+    """
+    # names differing only in case share a key, so keep every original per key
+    by_key = defaultdict(list)
+    for lo, mf in mf_pairs:
+        by_key[lo].append(mf)
+    ac = ahocorasick.Automaton()
+    for lo, mfs in by_key.items():
+        ac.add_word(lo, tuple(mfs))
+    ac.make_automaton()
+    return ac
+
+def detect_mutual_fund_mentions(article_id: str, text: str, mf_pairs: tuple):
+    """
+    Return list of mutual fund firm names found in an article's search text
+    (normalize_article's lowercased title/description/content).
+    mf_pairs comes from mf_lower_pairs(mf_list).
     Simple case-insensitive substring matching (can be replaced by fuzzy matching).
+    Uses a single Aho-Corasick pass over the text when pyahocorasick is installed.
     """
-    text = " ".join([article.get("title",""), article.get("description",""), article.get("content","")]).lower()
-    found = []
-    for mf in mf_list:
-        if mf.lower() in text:
-            found.append(mf)
-    # also simple pattern match for 'AMC' or 'Mutual Fund' mentions with firm names
-    # return unique
-    return sorted(list(set(found)))
+    if ahocorasick is not None and mf_pairs:
+        return sorted({mf for _, mfs in _mf_automaton(mf_pairs).iter(text) for mf in mfs})
+    return sorted({orig for lo, orig in mf_pairs if lo in text})